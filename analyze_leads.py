@@ -2,23 +2,28 @@
 """
 Script to analyze leads JSON and extract top candidates for the report.
 """
-import json
+import heapq
+import orjson
+
+
+def lead_sort_key(lead):
+    """Sort key: score, then number of mentions."""
+    return (lead['qualification']['score'], lead['organisation']['mentions'])
+
 
 def load_and_analyze_leads(leads_file):
     """Load leads and return top candidates with their data."""
-    with open(leads_file, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    with open(leads_file, 'rb') as f:
+        data = orjson.loads(f.read())
 
     print(f"Total organisations: {data['total_organisations_analysees']}")
     print(f"Leads qualifiés: {data['leads_qualifies']}")
     print(f"\nTop 15 leads by score and mentions:")
 
-    # Sort by score, then by mentions
-    sorted_leads = sorted(data['leads'],
-                         key=lambda x: (x['qualification']['score'], x['organisation']['mentions']),
-                         reverse=True)
+    # Top 15 by score, then by mentions (partial selection, no full sort)
+    top_leads = heapq.nlargest(15, data['leads'], key=lead_sort_key)
 
-    for i, lead in enumerate(sorted_leads[:15], 1):
+    for i, lead in enumerate(top_leads, 1):
         org = lead['organisation']
         qual = lead['qualification']
         print(f"\n{i}. {org['nom']}")
@@ -33,12 +38,12 @@ def load_and_analyze_leads(leads_file):
             'total_organisations': data['total_organisations_analysees'],
             'leads_qualifies': data['leads_qualifies']
         },
-        'top_leads': sorted_leads[:15]
+        'top_leads': top_leads
     }
 
     output_file = leads_file.replace('google_news_leads.json', 'top_15_leads.json')
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(output, f, ensure_ascii=False, indent=2)
+    with open(output_file, 'wb') as f:
+        f.write(orjson.dumps(output, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
 
     print(f"\n✓ Saved top 15 leads to: {output_file}")
     return output_file
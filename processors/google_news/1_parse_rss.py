@@ -5,51 +5,42 @@ Input:  data/lake/google_news_rss/<date>/*.xml
 Output: data/lake/google_news_rss/<date>/articles_raw.csv
 """
 
-import xml.etree.ElementTree as ET
+from lxml import etree
 from pathlib import Path
 from datetime import datetime
 import csv
+from collections.abc import Iterator
 
 
-def extract_articles_from_xml(xml_file: Path, signal_name: str) -> list[dict]:
-    """Extrait les articles d'un fichier XML RSS avec URL"""
-    articles = []
-
+def extract_articles_from_xml(xml_file: Path, signal_name: str) -> Iterator[dict]:
+    """Extrait les articles d'un fichier XML RSS avec URL (générateur, un article à la fois)"""
     try:
-        tree = ET.parse(xml_file)
-        root = tree.getroot()
-
-        # Les items sont dans <channel><item>
-        items = root.findall('.//item')
-
-        for item in items:
-            title_elem = item.find('title')
-            source_elem = item.find('source')
-            link_elem = item.find('link')
-            pub_date_elem = item.find('pubDate')
-
-            title = title_elem.text if title_elem is not None else "N/A"
-            source = source_elem.text if source_elem is not None else "N/A"
+        # Parcours en streaming des <item>: chaque élément est libéré après lecture
+        for _, item in etree.iterparse(str(xml_file), events=('end',), tag='item'):
+            title = item.findtext('title', default="N/A")
+            source = item.findtext('source', default="N/A")
 
             # Extraire l'URL de l'article depuis <link> (URL Google News qui redirige vers l'article)
-            url = link_elem.text if link_elem is not None else "N/A"
+            url = item.findtext('link', default="N/A")
 
             # Extraire la date de publication
-            pub_date = pub_date_elem.text if pub_date_elem is not None else "N/A"
+            pub_date = item.findtext('pubDate', default="N/A")
 
-            articles.append({
+            yield {
                 "signal": signal_name,
                 "titre": title,
                 "source": source,
                 "url": url,
                 "date": pub_date
-            })
+            }
+
+            item.clear()
+            while item.getprevious() is not None:
+                del item.getparent()[0]
 
     except Exception as e:
         print(f"   ❌ Erreur lors du parsing de {xml_file.name}: {e}")
 
-    return articles
-
 
 def main():
     """Parse le fichier XML consolidé et crée un CSV avec URLs"""
@@ -71,34 +62,32 @@ def main():
         print(f"   Exécutez d'abord: python scrapers/google_news/scraper.py")
         return
 
-    all_articles = []
+    # Créer le CSV avec URLs, écrit au fil du parsing
+    csv_file = data_dir / "articles_raw.csv"
+    total = 0
+    signal_counts = {}
 
     print(f"📰 Traitement: {consolidated_file.name}")
-    articles = extract_articles_from_xml(consolidated_file, "consolidated")
-    all_articles.extend(articles)
-    print(f"   ✅ {len(articles)} articles extraits")
-
-    # Créer le CSV avec URLs
-    csv_file = data_dir / "articles_raw.csv"
 
     with open(csv_file, 'w', newline='', encoding='utf-8') as f:
         writer = csv.DictWriter(f, fieldnames=['signal', 'titre', 'source', 'url', 'date'])
         writer.writeheader()
-        writer.writerows(all_articles)
+
+        for article in extract_articles_from_xml(consolidated_file, "consolidated"):
+            writer.writerow(article)
+            total += 1
+            signal = article['signal']
+            signal_counts[signal] = signal_counts.get(signal, 0) + 1
+
+    print(f"   ✅ {total} articles extraits")
 
     print(f"\n{'='*60}")
     print(f"✅ CSV créé: {csv_file}")
-    print(f"📊 Total: {len(all_articles)} articles")
-
-    # Statistiques par signal
-    signal_counts = {}
-    for article in all_articles:
-        signal = article['signal']
-        signal_counts[signal] = signal_counts.get(signal, 0) + 1
+    print(f"📊 Total: {total} articles")
 
     print(f"\n📁 Répartition par signal:")
     for signal, count in sorted(signal_counts.items(), key=lambda x: x[1], reverse=True):
-        percentage = (count / len(all_articles) * 100) if len(all_articles) > 0 else 0
+        percentage = (count / total * 100) if total > 0 else 0
         print(f"   • {signal}: {count} articles ({percentage:.1f}%)")
 
     print(f"\n➡️  Prochaine étape: python processors/google_news/2_filter_with_llm.py")
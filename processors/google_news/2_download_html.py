@@ -1,23 +1,73 @@
 #!/usr/bin/env python3
 """
-Étape 2: Télécharge les HTMLs de tous les articles via Selenium (pour suivre les redirections Google News)
+Étape 2: Télécharge les HTMLs de tous les articles
+        - HTTP direct quand l'URL de l'article est décodable depuis le lien Google News
+        - Selenium en dernier recours (pour suivre les redirections JavaScript de Google News)
 Input:  data/lake/google_news_rss/<date>/articles_raw.csv
 Output: data/lake/google_news_html/<date>/article_*.html
+Cache:  data/cache/html/<sha1(url canonique)>.html.gz (7 jours, articles acceptés seulement)
 """
 
 import csv
+import functools
+import gzip
+import hashlib
+import os
+import queue
+import sys
 from pathlib import Path
 from datetime import datetime
 from time import sleep
 from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
+from selenium.common.exceptions import WebDriverException
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import threading
+import time
+
+# Décodage des liens Google News et normalisation d'URLs: module partagé avec le scraper
+sys.path.append(str(Path(__file__).resolve().parents[2] / "scrapers" / "google_news"))
+from google_news_urls import resolve_google_news, canonical_url
 
 
 # Configuration
 MAX_WORKERS = 4  # Nombre de navigateurs parallèles
+HTTP_WORKERS = 16  # Nombre de téléchargements HTTP parallèles (les navigateurs restent limités à MAX_WORKERS)
+MAX_PER_HOST = 4  # Requêtes simultanées maximum par domaine (politesse)
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+# Session HTTP partagée: réutilise les connexions (TCP + TLS) par domaine
+SESSION = requests.Session()
+SESSION.headers.update({"User-Agent": USER_AGENT})
+_adapter = HTTPAdapter(pool_connections=32, pool_maxsize=32,
+                       max_retries=Retry(total=2, backoff_factor=0.3))
+SESSION.mount('https://', _adapter)
+SESSION.mount('http://', _adapter)
+
+# Ressources inutiles pour récupérer page_source (images, polices, CSS, vidéos, traqueurs)
+BLOCKED_URLS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg",
+    "*.woff", "*.woff2", "*.ttf", "*.css", "*.mp4",
+    "*googletagmanager.com/*", "*doubleclick.net/*", "*google-analytics.com/*"
+]
+
+# Cache des HTML déjà téléchargés, indexé par URL canonique
+HTML_CACHE_DIR = Path("data/cache/html")
+HTML_CACHE_TTL = 7 * 24 * 3600  # Durée de validité d'un HTML en cache (secondes)
+
+# Sémaphores par domaine pour limiter les requêtes simultanées vers un même site
+_host_slots = {}
+_host_slots_lock = threading.Lock()
+
+# Pool de navigateurs réutilisés d'un article à l'autre: MAX_WORKERS places,
+# chaque navigateur est démarré au premier besoin (None = place libre sans navigateur)
+DRIVERS = queue.Queue()
+for _ in range(MAX_WORKERS):
+    DRIVERS.put(None)
 
 # Domaines québécois/canadiens acceptés
 ALLOWED_DOMAINS = {
@@ -42,34 +92,95 @@ ALLOWED_DOMAINS = {
 }
 
 
-def is_quebec_canadian_domain(url: str) -> bool:
-    """Vérifie si l'URL est d'un domaine québécois/canadien accepté"""
-    try:
-        parsed = urlparse(url)
-        domain = parsed.netloc.lower()
+# Domaines acceptés sous forme de labels inversés (ex: ('ca', 'lapresse')), calculés une seule fois
+ALLOWED_REV = {tuple(reversed(allowed.split('.'))) for allowed in ALLOWED_DOMAINS}
 
-        # Retirer 'www.' si présent
-        if domain.startswith('www.'):
-            domain = domain[4:]
 
-        # Accepter tous les .ca (canadiens par défaut)
-        if domain.endswith('.ca'):
-            return True
+@functools.lru_cache(maxsize=4096)
+def _check_domain(domain: str) -> bool:
+    """Vérifie un domaine normalisé (minuscules, sans 'www.'), mis en cache par domaine"""
+    # Accepter tous les .ca (canadiens par défaut)
+    if domain.endswith('.ca'):
+        return True
 
-        # Vérifier si le domaine exact est dans la liste
-        if domain in ALLOWED_DOMAINS:
+    # Vérifier le domaine exact ou un domaine parent (sous-domaine d'un domaine accepté)
+    labels = tuple(reversed(domain.split('.')))
+    for n in range(1, len(labels) + 1):
+        if labels[:n] in ALLOWED_REV:
             return True
 
-        # Vérifier si c'est un sous-domaine d'un domaine accepté
-        for allowed in ALLOWED_DOMAINS:
-            if domain.endswith('.' + allowed):
-                return True
+    return False
 
-        return False
+
+def is_quebec_canadian_domain(url: str) -> bool:
+    """Vérifie si l'URL est d'un domaine québécois/canadien accepté"""
+    try:
+        domain = urlparse(url).netloc.lower().removeprefix('www.')
+        return _check_domain(domain)
     except:
         return False
 
 
+def article_key(url: str, resolved_url: str | None) -> tuple[str, str, str]:
+    """
+    Clé de déduplication: domaine + chemin + paramètres de l'article (ou de l'identifiant Google News si opaque)
+    Seuls les paramètres de suivi sont ignorés: "?p=123" et "?p=456" sont deux articles distincts
+    """
+    parsed = urlparse(canonical_url(resolved_url or url))
+    return parsed.netloc.removeprefix('www.'), parsed.path.rstrip('/'), parsed.query
+
+
+def html_cache_file(url: str) -> Path:
+    """Fichier de cache d'une URL: sha1 de l'URL canonique"""
+    key = hashlib.sha1(canonical_url(url).encode('utf-8')).hexdigest()
+    return HTML_CACHE_DIR / f"{key}.html.gz"
+
+
+def load_cached_html(cache_file: Path, output_file: Path) -> str | None:
+    """Restaure un HTML depuis le cache vers output_file, retourne l'URL finale (None si absent ou expiré)"""
+    try:
+        if time.time() - cache_file.stat().st_mtime > HTML_CACHE_TTL:
+            return None
+        final_url, _, html = gzip.decompress(cache_file.read_bytes()).partition(b"\n")
+    except (OSError, EOFError):  # Absent ou tronqué
+        return None
+    output_file.write_bytes(html)
+    return final_url.decode('utf-8')
+
+
+def save_cached_html(cache_file: Path, final_url: str, html: bytes):
+    """Met en cache l'URL finale (première ligne) et le HTML, compressés en gzip"""
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = cache_file.with_name(f"{cache_file.name}.{threading.get_ident()}.tmp")
+    tmp_file.write_bytes(gzip.compress(final_url.encode('utf-8') + b"\n" + html, compresslevel=6))
+    os.replace(tmp_file, cache_file)
+
+
+def host_slot(url: str) -> threading.BoundedSemaphore:
+    """Sémaphore du domaine de l'URL (MAX_PER_HOST requêtes simultanées)"""
+    host = urlparse(url).netloc.lower()
+    with _host_slots_lock:
+        if host not in _host_slots:
+            _host_slots[host] = threading.BoundedSemaphore(MAX_PER_HOST)
+        return _host_slots[host]
+
+
+def download_html_http(url: str, output_file: Path, timeout: int = 15) -> tuple[bool, str]:
+    """Télécharge le HTML d'une URL d'article directement en HTTP"""
+    try:
+        with host_slot(url):
+            response = SESSION.get(url, timeout=timeout)
+        response.raise_for_status()
+
+        # Octets bruts: pas de détection d'encodage ni de ré-encodage (trafilatura décode lui-même)
+        output_file.write_bytes(response.content)
+
+        return True, response.url
+
+    except Exception:
+        return False, ""
+
+
 def create_driver():
     """Crée un driver Chrome headless"""
     chrome_options = Options()
@@ -77,9 +188,38 @@ def create_driver():
     chrome_options.add_argument("--no-sandbox")
     chrome_options.add_argument("--disable-dev-shm-usage")
     chrome_options.add_argument("--disable-gpu")
-    chrome_options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
+    chrome_options.add_argument("--disable-extensions")
+    chrome_options.add_argument("--blink-settings=imagesEnabled=false")
+    chrome_options.add_argument(f"user-agent={USER_AGENT}")
+    chrome_options.add_experimental_option("prefs", {
+        "profile.managed_default_content_settings.images": 2,
+        "profile.default_content_setting_values.stylesheet": 2
+    })
     chrome_options.page_load_strategy = 'eager'  # Ne pas attendre toutes les ressources, juste le DOM
-    return webdriver.Chrome(options=chrome_options)
+
+    driver = webdriver.Chrome(options=chrome_options)
+
+    # Bloquer les ressources non-document (seul le HTML est conservé)
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URLS})
+    return driver
+
+
+def driver_is_alive(driver) -> bool:
+    """Vérifie que le navigateur répond encore (sinon il sera recréé)"""
+    try:
+        driver.current_url
+        return True
+    except WebDriverException:
+        return False
+
+
+def close_drivers():
+    """Ferme tous les navigateurs du pool"""
+    while not DRIVERS.empty():
+        driver = DRIVERS.get_nowait()
+        if driver is not None:
+            driver.quit()
 
 
 def download_html_selenium(driver, url: str, output_file: Path, timeout: int = 15) -> tuple[bool, str]:
@@ -114,44 +254,68 @@ def download_html_selenium(driver, url: str, output_file: Path, timeout: int = 1
 
 def process_article_download(task_data):
     """Traite le téléchargement d'un article (pour parallélisation)"""
-    i, total, article, output_dir, article_counter = task_data
-
-    # Créer un driver pour ce thread
-    driver = create_driver()
-
-    try:
-        url = article['url']
-
-        print(f"[{i}/{total}] {article['titre'][:50]}...")
-
-        filename = sanitize_filename(url, article_counter)
-        output_file = output_dir / filename
-
-        # Télécharger avec Selenium (pas de retry, on skip si trop lent)
-        success, final_url = download_html_selenium(driver, url, output_file, timeout=15)
-
-        if success:
-            # Vérifier si le domaine final est québécois/canadien
-            if is_quebec_canadian_domain(final_url):
-                file_size = output_file.stat().st_size
-                print(f"[{i}/{total}] ✅ {filename} ({file_size:,} bytes)")
-                print(f"[{i}/{total}] 🔗 {final_url[:80]}...")
-
-                return {
-                    'success': True,
-                    'article': article,
-                    'filename': filename,
-                    'final_url': final_url
-                }
-            else:
-                print(f"[{i}/{total}] ⏭️  Ignoré (domaine étranger: {final_url.split('/')[2]})")
-                output_file.unlink()  # Supprimer le fichier
-                return {'success': False, 'skipped': True}
+    i, total, article, resolved_url, output_dir, article_counter = task_data
+
+    url = article['url']
+    titre = article['titre'][:50]
+
+    filename = sanitize_filename(url, article_counter)
+    output_file = output_dir / filename
+
+    # Déjà téléchargé lors d'une exécution précédente
+    cache_file = html_cache_file(resolved_url or url)
+    final_url = load_cached_html(cache_file, output_file)
+    if final_url is not None and not is_quebec_canadian_domain(final_url):
+        final_url = None  # Entrée d'avant le filtrage du cache (ex: redirection inachevée): retélécharger
+    success = from_cache = final_url is not None
+
+    # Chemin rapide: URL de l'article décodée depuis le lien Google News
+    if not success and resolved_url:
+        success, final_url = download_html_http(resolved_url, output_file)
+
+    if not success:
+        # Chemin lent: Selenium (pas de retry, on skip si trop lent), navigateur emprunté au pool
+        driver = DRIVERS.get()
+        try:
+            if driver is None:
+                driver = create_driver()
+            success, final_url = download_html_selenium(driver, resolved_url or url, output_file, timeout=15)
+            if not success and not driver_is_alive(driver):
+                driver.quit()
+                driver = None
+        except WebDriverException as e:
+            print(f"   ❌ Navigateur indisponible: {str(e)[:100]}")
+            if driver is not None:
+                driver.quit()
+            driver = None
+        finally:
+            DRIVERS.put(driver)
+
+    if success:
+        # Vérifier si le domaine final est québécois/canadien
+        if is_quebec_canadian_domain(final_url):
+            # Seuls les articles acceptés sont mis en cache: une page Google News (redirection JS
+            # inachevée, consentement) ou un domaine refusé sera retenté à la prochaine exécution
+            if not from_cache and urlparse(final_url).netloc.lower() != 'news.google.com':
+                save_cached_html(cache_file, final_url, output_file.read_bytes())
+
+            file_size = output_file.stat().st_size
+            cached = " (cache)" if from_cache else ""
+            print(f"[{i}/{total}] ✅ {titre}... | {filename} ({file_size:,} bytes){cached} | 🔗 {final_url[:70]}...")
+
+            return {
+                'success': True,
+                'article': article,
+                'filename': filename,
+                'final_url': final_url
+            }
         else:
-            return {'success': False, 'skipped': False}
-
-    finally:
-        driver.quit()
+            print(f"[{i}/{total}] ⏭️  {titre}... | Ignoré (domaine étranger: {final_url.split('/')[2]})")
+            output_file.unlink()  # Supprimer le fichier
+            return {'success': False, 'skipped': True}
+    else:
+        print(f"[{i}/{total}] ❌ {titre}... | Échec du téléchargement")
+        return {'success': False, 'skipped': False}
 
 
 def sanitize_filename(url: str, article_id: int) -> str:
@@ -173,9 +337,9 @@ def main():
     output_dir = Path("data/lake/google_news_html") / date_str
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    print(f"🌐 Téléchargement des HTMLs avec Selenium - {date_str}")
+    print(f"🌐 Téléchargement des HTMLs (HTTP, Selenium en repli) - {date_str}")
     print(f"📁 Destination: {output_dir}")
-    print(f"⚡ Traitement parallèle avec {MAX_WORKERS} navigateurs\n")
+    print(f"⚡ Traitement parallèle: {HTTP_WORKERS} téléchargements HTTP, {MAX_WORKERS} navigateurs\n")
 
     # Lire tous les articles
     articles = []
@@ -183,7 +347,30 @@ def main():
         reader = csv.DictReader(f)
         articles = list(reader)
 
-    print(f"📰 {len(articles)} articles à télécharger\n")
+    # Pré-filtrage: décoder les liens Google News, écarter d'avance les domaines étrangers
+    # et les doublons (même article derrière plusieurs liens Google News)
+    candidates = []
+    seen = set()
+    skipped_count = 0
+    duplicate_count = 0
+    for article in articles:
+        resolved_url = resolve_google_news(article['url'])
+        if resolved_url and not is_quebec_canadian_domain(resolved_url):
+            skipped_count += 1
+            continue
+
+        key = article_key(article['url'], resolved_url)
+        if key in seen:
+            duplicate_count += 1
+            continue
+        seen.add(key)
+
+        candidates.append((article, resolved_url))
+
+    print(f"📰 {len(articles)} articles lus")
+    print(f"⏭️  {skipped_count} ignorés d'avance (domaine étranger)")
+    print(f"🔄 {duplicate_count} doublons écartés")
+    print(f"📥 {len(candidates)} articles à télécharger\n")
 
     # Préparer les tâches pour traitement parallèle
     article_counter = threading.Lock()
@@ -194,50 +381,49 @@ def main():
             counter[0] += 1
             return counter[0]
 
-    tasks = [(i+1, len(articles), article, output_dir, get_counter()) for i, article in enumerate(articles)]
+    tasks = [(i+1, len(candidates), article, resolved_url, output_dir, get_counter())
+             for i, (article, resolved_url) in enumerate(candidates)]
 
     # Télécharger en parallèle
     success_count = 0
-    skipped_count = 0
     failed_count = 0
-    filtered_articles = []
-
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        # Soumettre toutes les tâches
-        future_to_article = {executor.submit(process_article_download, task): task for task in tasks}
-
-        # Récupérer les résultats au fur et à mesure
-        for future in as_completed(future_to_article):
-            result = future.result()
-
-            if result['success']:
-                success_count += 1
-                article = result['article']
-                article['html_file'] = result['filename']
-                article['final_url'] = result['final_url']
-                filtered_articles.append(article)
-            elif result.get('skipped'):
-                skipped_count += 1
-            else:
-                failed_count += 1
 
-    print()
+    # Mapping CSV pour référence, complété au fil des téléchargements réussis
+    mapping_file = output_dir / "articles_mapping.csv"
 
-    # Mettre à jour la liste des articles avec seulement ceux téléchargés
-    articles = filtered_articles
+    try:
+        with ThreadPoolExecutor(max_workers=HTTP_WORKERS) as executor, \
+                open(mapping_file, 'w', newline='', encoding='utf-8') as f:
+            fieldnames = ['signal', 'titre', 'source', 'url', 'date', 'final_url', 'html_file']
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+
+            # Soumettre toutes les tâches
+            future_to_article = {executor.submit(process_article_download, task): task for task in tasks}
+
+            # Récupérer les résultats au fur et à mesure
+            for future in as_completed(future_to_article):
+                result = future.result()
+
+                if result['success']:
+                    success_count += 1
+                    article = result['article']
+                    article['html_file'] = result['filename']
+                    article['final_url'] = result['final_url']
+                    writer.writerow(article)
+                elif result.get('skipped'):
+                    skipped_count += 1
+                else:
+                    failed_count += 1
+    finally:
+        close_drivers()
 
-    # Créer un mapping CSV pour référence
-    mapping_file = output_dir / "articles_mapping.csv"
-    with open(mapping_file, 'w', newline='', encoding='utf-8') as f:
-        fieldnames = ['signal', 'titre', 'source', 'url', 'date', 'final_url', 'html_file']
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(articles)
+    print()
 
     # Résumé
     print(f"\n{'='*60}")
     print(f"✅ Téléchargement terminé!")
-    print(f"📊 Téléchargés: {success_count} | Ignorés: {skipped_count} | Échecs: {failed_count}")
+    print(f"📊 Téléchargés: {success_count} | Ignorés: {skipped_count} | Doublons: {duplicate_count} | Échecs: {failed_count}")
     print(f"➡️  Prochaine étape: python processors/google_news/3_build_warehouse.py")
 
 
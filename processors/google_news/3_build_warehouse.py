@@ -6,11 +6,39 @@ Output: data/warehouse/google_news_<date>.csv
 """
 
 import csv
+import os
 from pathlib import Path
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
 import trafilatura
 
 
+def extract_content(html_file: Path) -> tuple[str, str]:
+    """Extrait le texte d'un HTML (exécuté dans un processus séparé), retourne (contenu, statut)"""
+    if not html_file.exists():
+        return "", "❌ HTML introuvable"
+
+    try:
+        html_content = html_file.read_bytes()  # trafilatura détecte l'encodage
+        # Seul le texte est conservé: pas de métadonnées (htmldate), pas d'algorithmes de repli
+        contenu = trafilatura.extract(
+            html_content,
+            no_fallback=True,
+            include_comments=False,
+            include_tables=False,
+            include_formatting=False,
+            deduplicate=False,
+            with_metadata=False,
+            favor_precision=True
+        ) or ""
+    except Exception as e:
+        return "", f"❌ Erreur extraction: {e}"
+
+    if contenu:
+        return contenu, f"✅ {len(contenu)} caractères extraits"
+    return contenu, "⚠️  Aucun contenu extrait"
+
+
 def main():
     """Construit la table finale du warehouse"""
     date_str = datetime.now().strftime("%Y-%m-%d")
@@ -38,65 +66,49 @@ def main():
 
     print(f"📰 {len(articles)} articles à intégrer\n")
 
-    # Extraire le contenu textuel de chaque HTML avec trafilatura
+    # Extraire le contenu textuel de chaque HTML avec trafilatura (un processus par cœur)
     html_dir = Path("data/lake/google_news_html") / date_str
-    warehouse_data = []
-
-    for i, article in enumerate(articles, 1):
-        print(f"[{i}/{len(articles)}] {article['titre'][:60]}...")
-
-        html_file = html_dir / article['html_file']
-
-        # Extraire le texte de l'article
-        contenu = ""
-        if html_file.exists():
-            try:
-                html_content = html_file.read_text(encoding='utf-8')
-                contenu = trafilatura.extract(html_content) or ""
-
-                if contenu:
-                    print(f"   ✅ {len(contenu)} caractères extraits")
-                else:
-                    print(f"   ⚠️  Aucun contenu extrait")
-            except Exception as e:
-                print(f"   ❌ Erreur extraction: {e}")
-        else:
-            print(f"   ❌ HTML introuvable")
-
-        warehouse_data.append({
-            'signal': article['signal'],
-            'titre': article['titre'],
-            'source': article['source'],
-            'url': article.get('final_url', article['url']),  # Utiliser final_url si disponible
-            'date': article.get('date', 'N/A'),
-            'contenu': contenu
-        })
-
-    print()
+    html_files = [html_dir / article['html_file'] for article in articles]
+    signal_counts = {}
+    total = 0
 
-    # Sauvegarder dans le warehouse
-    with open(output_file, 'w', newline='', encoding='utf-8') as f:
+    # Chaque ligne est écrite dès que son contenu est extrait (le contenu n'est pas gardé en mémoire)
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor, \
+            open(output_file, 'w', newline='', encoding='utf-8') as f:
         fieldnames = ['signal', 'titre', 'source', 'url', 'date', 'contenu']
         writer = csv.DictWriter(f, fieldnames=fieldnames)
         writer.writeheader()
-        writer.writerows(warehouse_data)
+
+        results = executor.map(extract_content, html_files, chunksize=8)
+
+        for i, (article, (contenu, status)) in enumerate(zip(articles, results), 1):
+            print(f"[{i}/{len(articles)}] {status} | {article['titre'][:60]}...")
+
+            writer.writerow({
+                'signal': article['signal'],
+                'titre': article['titre'],
+                'source': article['source'],
+                'url': article.get('final_url', article['url']),  # Utiliser final_url si disponible
+                'date': article.get('date', 'N/A'),
+                'contenu': contenu
+            })
+
+            total += 1
+            signal = article['signal']
+            signal_counts[signal] = signal_counts.get(signal, 0) + 1
+
+    print()
 
     # Résumé
     print(f"{'='*60}")
     print(f"✅ Table warehouse créée!")
     print(f"📊 Résultats:")
-    print(f"   Articles: {len(warehouse_data)}")
+    print(f"   Articles: {total}")
     print(f"   Fichier: {output_file}")
 
-    # Statistiques par signal
-    signal_counts = {}
-    for article in warehouse_data:
-        signal = article['signal']
-        signal_counts[signal] = signal_counts.get(signal, 0) + 1
-
     print(f"\n📁 Répartition par signal:")
     for signal, count in sorted(signal_counts.items(), key=lambda x: x[1], reverse=True):
-        percentage = (count / len(warehouse_data) * 100) if len(warehouse_data) > 0 else 0
+        percentage = (count / total * 100) if total > 0 else 0
         print(f"   • {signal}: {count} articles ({percentage:.1f}%)")
 
     print(f"\n✅ Pipeline terminé! Données prêtes pour analyse.")
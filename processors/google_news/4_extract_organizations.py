@@ -4,22 +4,44 @@
 Input:  data/warehouse/google_news_<date>.csv
 Output: data/warehouse/google_news_organizations_<date>.json
         data/warehouse/google_news_summaries_<date>.json
+Option: --per-article pour écrire aussi un JSON par article (débogage)
 """
 
 import csv
-import json
+import sys
+import orjson
 from pathlib import Path
 from datetime import datetime
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
 import os
+import random
+import re
+import unicodedata
 from time import sleep
-from collections import defaultdict
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import defaultdict, Counter
+from typing import TypedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from cache import llm_cached, llm_forget
 
 
 # Configuration Gemini
 GEMINI_MODEL = "gemini-2.5-flash"
 MAX_WORKERS = 4  # Nombre de threads parallèles pour Gemini
+MAX_IN_FLIGHT = MAX_WORKERS * 4  # Tâches soumises simultanément (fenêtre glissante)
+MAX_RETRIES = 3  # Nouvelles tentatives par appel Gemini (quota 429, erreurs réseau)
+# Erreurs passagères qui justifient une nouvelle tentative; les autres (réponse bloquée, requête invalide)
+# se reproduiraient à l'identique à température 0
+TRANSIENT_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.InternalServerError,
+    ConnectionError,
+    TimeoutError
+)
+# Budget de contenu par article: ~3 caractères par token en français, soit ~1000 tokens
+MAX_CONTENU_CHARS = 3000
 
 # Prompt pour extraction d'organisations ET résumé
 EXTRACTION_PROMPT = """Analyse cet article de presse québécois et extrais les informations suivantes.
@@ -55,30 +77,37 @@ Rédige un résumé concis de l'article en 3-4 phrases qui capture:
 - Les acteurs clés
 - L'enjeu ou la problématique
 - La position ou action principale
-
-**IMPORTANT - FORMAT JSON:**
-- Réponds UNIQUEMENT en JSON valide
-- Échappe les guillemets dans les textes avec \"
-- Remplace les apostrophes par des espaces simples
-- Pas de retours à la ligne dans les valeurs de texte
-
-Réponds UNIQUEMENT en format JSON:
-{{
-  "resume_article": "Résumé de 3-4 phrases...",
-  "organisations": [
-    {{
-      "nom": "...",
-      "type": "...",
-      "action": "...",
-      "enjeu": "...",
-      "citation": "...",
-      "resume": "..."
-    }}
-  ]
-}}
 """
 
 
+# Schéma imposé à la réponse (mode JSON de Gemini: pas de texte libre à nettoyer)
+class Organisation(TypedDict):
+    nom: str
+    type: str
+    action: str
+    enjeu: str
+    citation: str
+    resume: str
+
+
+class Extraction(TypedDict):
+    resume_article: str
+    organisations: list[Organisation]
+
+
+# Gabarit découpé une seule fois autour des champs dynamiques (évite str.format à chaque article)
+_PROMPT_HEAD, _rest = EXTRACTION_PROMPT.split('{titre}')
+_PROMPT_MID, _PROMPT_TAIL = _rest.split('{contenu}')
+_PROMPT_HEAD, _PROMPT_MID, _PROMPT_TAIL = (
+    part.replace('{{', '{').replace('}}', '}') for part in (_PROMPT_HEAD, _PROMPT_MID, _PROMPT_TAIL)
+)
+
+# Normalisation des noms d'organisations pour l'agrégation
+_PARENS_RE = re.compile(r'\(([^)]*)\)')
+_SPACES_RE = re.compile(r'\s+')
+_WORDS_RE = re.compile(r'[^\W\d_]+')
+
+
 def initialize_gemini():
     """Initialise l'API Gemini"""
     api_key = os.environ.get("GEMINI_API_KEY")
@@ -89,58 +118,44 @@ def initialize_gemini():
         exit(1)
 
     genai.configure(api_key=api_key)
-    model = genai.GenerativeModel(GEMINI_MODEL)
+    model = genai.GenerativeModel(
+        GEMINI_MODEL,
+        generation_config=genai.GenerationConfig(
+            response_mime_type="application/json",
+            response_schema=Extraction,
+            temperature=0.0
+        )
+    )
     return model
 
 
+def generate_with_retry(model, prompt: str) -> str:
+    """Appelle Gemini, avec backoff exponentiel et jitter entre les tentatives (erreurs passagères seulement)"""
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            return model.generate_content(prompt).text
+        except TRANSIENT_ERRORS:
+            if attempt == MAX_RETRIES:
+                raise
+            sleep(2 ** attempt + random.uniform(0, 1))
+
+
 def extract_organizations_and_summary(model, titre: str, contenu: str) -> dict:
     """Extrait les organisations ET le résumé d'un article avec Gemini"""
     try:
-        # Limiter le contenu à 3000 caractères pour éviter tokens excessifs
-        contenu_tronque = contenu[:3000] if len(contenu) > 3000 else contenu
-
-        prompt = EXTRACTION_PROMPT.format(titre=titre, contenu=contenu_tronque)
-        response = model.generate_content(prompt)
+        # Limiter le contenu pour éviter tokens excessifs
+        contenu_tronque = contenu[:MAX_CONTENU_CHARS]
 
-        # Parser la réponse JSON
-        response_text = response.text.strip()
+        prompt = f"{_PROMPT_HEAD}{titre}{_PROMPT_MID}{contenu_tronque}{_PROMPT_TAIL}"
+        response_text = llm_cached(prompt, GEMINI_MODEL, lambda: generate_with_retry(model, prompt))
 
-        # Nettoyer le markdown si présent
-        if response_text.startswith("```json"):
-            response_text = response_text[7:]
-        if response_text.startswith("```"):
-            response_text = response_text[3:]
-        if response_text.endswith("```"):
-            response_text = response_text[:-3]
-
-        response_text = response_text.strip()
-
-        # Tenter de parser le JSON
         try:
-            data = json.loads(response_text)
-        except json.JSONDecodeError as json_err:
-            # Tentative de nettoyage du JSON
-            print(f"   ⚠️  JSON invalide, tentative de nettoyage...")
-
-            # Nettoyer les retours à la ligne dans les chaînes
-            import re
-            # Remplacer les retours à la ligne entre guillemets par des espaces
-            response_text = re.sub(r'"\s*\n\s*', '" ', response_text)
-
-            # Retry le parsing
-            try:
-                data = json.loads(response_text)
-                print(f"   ✅ JSON nettoyé et parsé avec succès")
-            except json.JSONDecodeError:
-                # Si ça échoue encore, logger et retourner vide
-                print(f"   ❌ Impossible de parser le JSON: {str(json_err)[:100]}")
-                # Sauvegarder le JSON problématique pour debug
-                debug_file = Path("debug_json_error.txt")
-                with open(debug_file, 'a', encoding='utf-8') as f:
-                    f.write(f"\n\n=== ERREUR POUR: {titre[:50]} ===\n")
-                    f.write(response_text)
-                    f.write(f"\nERREUR: {json_err}\n")
-                return {"resume_article": "", "organisations": []}
+            data = orjson.loads(response_text)
+        except orjson.JSONDecodeError as json_err:
+            # Réponse tronquée (ex: limite de tokens): ne pas la garder en cache
+            print(f"   ❌ Impossible de parser le JSON: {str(json_err)[:100]}")
+            llm_forget(prompt, GEMINI_MODEL)
+            return {"resume_article": "", "organisations": []}
 
         return {
             "resume_article": data.get("resume_article", ""),
@@ -152,9 +167,45 @@ def extract_organizations_and_summary(model, titre: str, contenu: str) -> dict:
         return {"resume_article": "", "organisations": []}
 
 
+def strip_accents(text: str) -> str:
+    """Retire les accents (é -> e)"""
+    return ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+
+
+def is_sigle(sigle: str, nom: str) -> bool:
+    """
+    Vrai si une parenthèse du nom est son sigle: un seul mot en majuscules dont les lettres
+    suivent les initiales du nom ("Coalition Avenir Québec (CAQ)", pas "Syndicat des enseignants (CSQ)")
+    """
+    sigle = sigle.strip()
+    if not sigle.isupper() or ' ' in sigle:
+        return False
+    initiales = iter(mot[0] for mot in _WORDS_RE.findall(strip_accents(_PARENS_RE.sub(' ', nom)).upper()))
+    return all(lettre in initiales for lettre in strip_accents(sigle) if lettre.isalpha())
+
+
+def org_key(nom: str) -> str:
+    """
+    Clé de regroupement d'un nom: sans accents, en minuscules, sans sigle entre parenthèses ni espaces superflus
+    Les autres parenthèses (ex: "(ministère de la Santé)") distinguent des organisations et sont gardées
+    """
+    key = _PARENS_RE.sub(lambda m: ' ' if is_sigle(m.group(1), nom) else m.group(0), nom)
+    key = _SPACES_RE.sub(' ', strip_accents(key).lower()).strip()
+    return key or nom.lower()
+
+
 def aggregate_organizations(all_extractions: list) -> dict:
-    """Agrège les organisations par nom"""
+    """Agrège les organisations par nom normalisé (variantes d'écriture et sigles regroupés)"""
+    # Sigles entre parenthèses: "Coalition Avenir Québec (CAQ)" rattache "CAQ" au nom complet
+    aliases = {}
+    for extraction in all_extractions:
+        for org_data in extraction["organisations"]:
+            for sigle in _PARENS_RE.findall(org_data["nom"]):
+                if is_sigle(sigle, org_data["nom"]):  # Sigle seulement, pas une précision
+                    aliases.setdefault(org_key(sigle), org_key(org_data["nom"]))
+
     org_dict = defaultdict(lambda: {
+        "noms": Counter(),
         "mentions": 0,
         "articles": [],
         "enjeux": set(),
@@ -164,10 +215,12 @@ def aggregate_organizations(all_extractions: list) -> dict:
 
     for extraction in all_extractions:
         for org_data in extraction["organisations"]:
-            nom = org_data["nom"]
+            key = org_key(org_data["nom"])
+            key = aliases.get(key, key)
 
-            org_dict[nom]["mentions"] += 1
-            org_dict[nom]["articles"].append({
+            org_dict[key]["noms"][org_data["nom"]] += 1
+            org_dict[key]["mentions"] += 1
+            org_dict[key]["articles"].append({
                 "titre": extraction["article"]["titre"],
                 "source": extraction["article"]["source"],
                 "url": extraction["article"]["url"],
@@ -177,20 +230,22 @@ def aggregate_organizations(all_extractions: list) -> dict:
                 "citation": org_data.get("citation", ""),
                 "resume": org_data.get("resume", "")
             })
-            org_dict[nom]["enjeux"].add(org_data["enjeu"])
-            org_dict[nom]["signaux"].add(extraction["article"]["signal"])
-            org_dict[nom]["types"].add(org_data["type"])
+            org_dict[key]["enjeux"].add(org_data["enjeu"])
+            org_dict[key]["signaux"].add(extraction["article"]["signal"])
+            org_dict[key]["types"].add(org_data["type"])
 
     # Convertir en format final
     organisations = []
-    for nom, data in org_dict.items():
+    for data in org_dict.values():
         organisations.append({
-            "nom": nom,
-            "type": list(data["types"])[0] if len(data["types"]) == 1 else ", ".join(data["types"]),
+            "nom": data["noms"].most_common(1)[0][0],  # Variante la plus fréquente
+            # Ensembles triés: l'ordre d'itération d'un set de str varie d'un processus à l'autre,
+            # or le type entre dans la clé de cache de l'étape 5
+            "type": ", ".join(sorted(data["types"])),
             "mentions": data["mentions"],
             "articles": data["articles"],
-            "enjeux_principaux": list(data["enjeux"]),
-            "signaux": list(data["signaux"])
+            "enjeux_principaux": sorted(data["enjeux"]),
+            "signaux": sorted(data["signaux"])
         })
 
     # Trier par nombre de mentions
@@ -203,8 +258,6 @@ def process_article(article_data):
     """Traite un article (pour parallélisation)"""
     i, article, model = article_data
 
-    print(f"[{i}] {article['titre'][:60]}...")
-
     result = extract_organizations_and_summary(model, article['titre'], article['contenu'])
 
     extraction_data = {
@@ -220,17 +273,34 @@ def process_article(article_data):
     }
 
     if result["organisations"]:
-        print(f"[{i}] ✅ {len(result['organisations'])} organisation(s) extraite(s)")
+        print(f"[{i}] ✅ {len(result['organisations'])} organisation(s) extraite(s) | {article['titre'][:60]}...")
     else:
-        print(f"[{i}] ⚠️  Aucune organisation identifiée")
+        print(f"[{i}] ⚠️  Aucune organisation identifiée | {article['titre'][:60]}...")
 
     return extraction_data
 
 
+def load_checkpoint(checkpoint_file: Path) -> dict:
+    """Charge les extractions déjà faites lors d'une exécution précédente, indexées par URL"""
+    done = {}
+    if checkpoint_file.exists():
+        with open(checkpoint_file, 'rb') as f:
+            for line in f:
+                try:
+                    extraction_data = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    continue  # Ligne tronquée par une interruption
+                done[extraction_data["article"]["url"]] = extraction_data
+    return done
+
+
 def main():
     """Extrait et agrège les organisations avec traitement parallèle"""
     date_str = datetime.now().strftime("%Y-%m-%d")
 
+    # Fichiers JSON par article: seulement sur demande (débogage)
+    per_article = "--per-article" in sys.argv[1:]
+
     input_file = Path("data/warehouse") / f"google_news_{date_str}.csv"
     output_orgs_file = Path("data/warehouse") / f"google_news_organizations_{date_str}.json"
     output_summaries_file = Path("data/warehouse") / f"google_news_summaries_{date_str}.json"
@@ -257,48 +327,76 @@ def main():
         reader = csv.DictReader(f)
         articles = list(reader)
 
-    print(f"📰 {len(articles)} articles à analyser\n")
+    # Reprendre les extractions déjà faites (checkpoint par URL)
+    checkpoint_file = extractions_dir / "extractions.jsonl"
+    done = load_checkpoint(checkpoint_file)
+    all_extractions_data = [done[article['url']] for article in articles if article['url'] in done]
+    pending = [article for article in articles if article['url'] not in done]
+
+    print(f"📰 {len(articles)} articles à analyser")
+    if all_extractions_data:
+        print(f"♻️  {len(all_extractions_data)} déjà extraits (checkpoint), {len(pending)} restants")
+    print()
 
     # Préparer les données pour traitement parallèle
-    article_tasks = [(i+1, article, model) for i, article in enumerate(articles)]
+    article_tasks = ((i+1, article, model) for i, article in enumerate(pending))
 
     # Traiter en parallèle avec ThreadPoolExecutor
-    all_extractions_data = []
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor, \
+            open(checkpoint_file, 'ab') as checkpoint:
+        active = set()
+
+        while True:
+            # Garder au plus MAX_IN_FLIGHT tâches soumises
+            for task in article_tasks:
+                active.add(executor.submit(process_article, task))
+                if len(active) >= MAX_IN_FLIGHT:
+                    break
+            if not active:
+                break
+
+            # Récupérer les résultats au fur et à mesure
+            done_futures, active = wait(active, return_when=FIRST_COMPLETED)
+            for future in done_futures:
+                extraction_data = future.result()
+                all_extractions_data.append(extraction_data)
+
+                # Sauvegarder extraction par article (--per-article)
+                if per_article:
+                    article_num = len(all_extractions_data)
+                    article_file = extractions_dir / f"article_{article_num:04d}.json"
+                    article_file.write_bytes(orjson.dumps(extraction_data, option=orjson.OPT_INDENT_2))
+
+                # Checkpoint (un résumé vide signale un échec Gemini: l'article sera retenté)
+                if extraction_data["article"]["resume"]:
+                    checkpoint.write(orjson.dumps(extraction_data) + b"\n")
+                    checkpoint.flush()
+
+    # Remettre les extractions dans l'ordre du CSV (les threads terminent dans le désordre):
+    # l'agrégation, et donc les articles envoyés à l'étape 5, restent identiques d'une exécution à l'autre
+    csv_order = {article['url']: i for i, article in enumerate(articles)}
+    all_extractions_data.sort(key=lambda e: csv_order.get(e["article"]["url"], len(csv_order)))
+
+    # Préparer pour agrégation et collecter les résumés
     all_extractions = []
     summaries = []
 
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        # Soumettre toutes les tâches
-        future_to_article = {executor.submit(process_article, task): task for task in article_tasks}
-
-        # Récupérer les résultats au fur et à mesure
-        for future in as_completed(future_to_article):
-            extraction_data = future.result()
-            all_extractions_data.append(extraction_data)
-
-            # Sauvegarder extraction par article
-            article_num = len(all_extractions_data)
-            article_file = extractions_dir / f"article_{article_num:04d}.json"
-            with open(article_file, 'w', encoding='utf-8') as f:
-                json.dump(extraction_data, f, ensure_ascii=False, indent=2)
-
-            # Préparer pour agrégation
-            if extraction_data["organisations"]:
-                all_extractions.append({
-                    "article": extraction_data["article"],
-                    "organisations": extraction_data["organisations"]
-                })
-
-            # Collecter résumé
-            summaries.append({
-                "titre": extraction_data["article"]["titre"],
-                "source": extraction_data["article"]["source"],
-                "url": extraction_data["article"]["url"],
-                "date": extraction_data["article"].get("date", "N/A"),
-                "signal": extraction_data["article"]["signal"],
-                "resume": extraction_data["article"]["resume"]
+    for extraction_data in all_extractions_data:
+        if extraction_data["organisations"]:
+            all_extractions.append({
+                "article": extraction_data["article"],
+                "organisations": extraction_data["organisations"]
             })
 
+        summaries.append({
+            "titre": extraction_data["article"]["titre"],
+            "source": extraction_data["article"]["source"],
+            "url": extraction_data["article"]["url"],
+            "date": extraction_data["article"].get("date", "N/A"),
+            "signal": extraction_data["article"]["signal"],
+            "resume": extraction_data["article"]["resume"]
+        })
+
     print()
 
     # Agréger par organisation
@@ -306,12 +404,10 @@ def main():
     aggregated_orgs = aggregate_organizations(all_extractions)
 
     # Sauvegarder le JSON des organisations
-    with open(output_orgs_file, 'w', encoding='utf-8') as f:
-        json.dump(aggregated_orgs, f, ensure_ascii=False, indent=2)
+    output_orgs_file.write_bytes(orjson.dumps(aggregated_orgs, option=orjson.OPT_INDENT_2))
 
     # Sauvegarder le JSON des résumés
-    with open(output_summaries_file, 'w', encoding='utf-8') as f:
-        json.dump({"articles": summaries}, f, ensure_ascii=False, indent=2)
+    output_summaries_file.write_bytes(orjson.dumps({"articles": summaries}, option=orjson.OPT_INDENT_2))
 
     # Résumé
     print(f"{'='*60}")
@@ -321,7 +417,8 @@ def main():
     print(f"   Articles avec organisations: {len(all_extractions)}/{len(articles)}")
     print(f"   Fichier organisations: {output_orgs_file}")
     print(f"   Fichier résumés: {output_summaries_file}")
-    print(f"   Extractions par article: {extractions_dir}/")
+    if per_article:
+        print(f"   Extractions par article: {extractions_dir}/")
 
     # Top 10 organisations
     if aggregated_orgs['organisations']:
@@ -3,22 +3,33 @@
 Étape 5: Qualifie les organisations comme leads potentiels pour Opubliq
 Input:  data/warehouse/google_news_organizations_<date>.json
 Output: data/marts/google_news_leads_<date>.json
+        data/marts/<date>/google_news_leads.jsonl (qualifications au fil de l'eau, reprise après interruption)
+Cache:  data/cache/qualifications/ (7 jours, ignoré avec --no-cache)
 """
 
-import json
+import hashlib
+import sys
+import orjson
 from pathlib import Path
 from datetime import datetime
 import google.generativeai as genai
+from google.generativeai import client as genai_client
 import os
+import re
+from itertools import islice
+from collections import Counter
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from cache import record_get, record_put
 
 
 # Configuration Gemini
 GEMINI_MODEL = "gemini-2.5-flash"
-MAX_WORKERS = 4
+MAX_WORKERS = 4  # Threads parallèles par clé API (quota par clé)
+BATCH_SIZE = 10  # Organisations évaluées par appel Gemini
+QUALIFICATION_TTL = 7 * 24 * 3600  # Durée de validité d'une qualification en cache (secondes)
 
-# Prompt de qualification
-QUALIFICATION_PROMPT = """Tu es un analyste en développement des affaires pour Opubliq, une firme québécoise spécialisée en:
+# Instructions de qualification (statiques: envoyées comme instruction système du modèle)
+QUALIFICATION_INSTRUCTIONS = """Tu es un analyste en développement des affaires pour Opubliq, une firme québécoise spécialisée en:
 
 **SERVICES OPUBLIQ:**
 1. **Recherche d'opinion publique**: Sondages, analyse de sentiment, études personnalisées
@@ -41,19 +52,8 @@ QUALIFICATION_PROMPT = """Tu es un analyste en développement des affaires pour
 
 ---
 
-**ORGANISATION À ÉVALUER:**
-
-NOM: {nom}
-TYPE: {type}
-MENTIONS: {mentions}
-
-**CONTEXTE DES ACTIONS:**
-{contexte_actions}
-
----
-
 **TA TÂCHE:**
-Évalue si cette organisation est un lead potentiel pour Opubliq.
+Évalue séparément si chacune des organisations fournies (blocs ### ORG N) est un lead potentiel pour Opubliq.
 
 **CRITÈRES D'ÉVALUATION:**
 1. Est-ce un type d'organisation cible? (association, syndicat, OBNL, ordre pro, coalition, groupe citoyen)
@@ -73,14 +73,18 @@ MENTIONS: {mentions}
 - 1: Pas un lead (hors cible ou pas de besoin apparent)
 
 **FORMAT JSON DE RÉPONSE:**
-{{
-  "lead_potentiel": true/false,
-  "score": 1-5,
-  "raison": "Explication concise en 1-2 phrases du pourquoi c'est/pas un lead",
-  "besoin_anticipe": "sondage, affaires publiques, communication, levée de fonds, aucun",
-  "urgence": "haute, moyenne, basse",
-  "note_contextuelle": "Détail additionnel pertinent (1 phrase)"
-}}
+Une liste avec un objet par organisation, dans le même ordre, avec son numéro ORG dans "id":
+[
+  {
+    "id": 1,
+    "lead_potentiel": true/false,
+    "score": 1-5,
+    "raison": "Explication concise en 1-2 phrases du pourquoi c'est/pas un lead",
+    "besoin_anticipe": "sondage, affaires publiques, communication, levée de fonds, aucun",
+    "urgence": "haute, moyenne, basse",
+    "note_contextuelle": "Détail additionnel pertinent (1 phrase)"
+  }
+]
 
 **IMPORTANT:**
 - Réponds UNIQUEMENT en JSON valide
@@ -88,98 +92,200 @@ MENTIONS: {mentions}
 - Focus sur les organisations avec un besoin clair et immédiat
 """
 
+# Gabarit d'une action dans le contexte d'une organisation
+_ARTICLE_TMPL = "{i}. Action: {action}\n   Enjeu: {enjeu}\n   Signal: {signal}\n   Résumé: {resume}"
+
+# Champs indispensables d'une qualification (affichage et tri des leads)
+REQUIRED_FIELDS = ('lead_potentiel', 'score', 'raison')
+
+# Balises markdown (```json ... ```) autour de la réponse JSON
+_FENCE_RE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$")
+
 
-def initialize_gemini():
-    """Initialise l'API Gemini"""
-    api_key = os.environ.get("GEMINI_API_KEY")
+def initialize_gemini() -> list:
+    """Initialise l'API Gemini: un modèle par clé API (GEMINI_API_KEYS séparées par des virgules)"""
+    api_keys = os.environ.get("GEMINI_API_KEYS") or os.environ.get("GEMINI_API_KEY", "")
+    api_keys = [key.strip() for key in api_keys.split(",") if key.strip()]
 
-    if not api_key:
+    if not api_keys:
         print("❌ Erreur: Variable d'environnement GEMINI_API_KEY non définie")
         print("   Exécutez: export GEMINI_API_KEY='votre_clé_api'")
+        print("   (ou GEMINI_API_KEYS='clé1,clé2' pour répartir la charge sur plusieurs quotas)")
         exit(1)
 
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel(GEMINI_MODEL)
-    return model
+    genai.configure(api_key=api_keys[0])
+    models = []
+    for api_key in api_keys:
+        model = genai.GenerativeModel(GEMINI_MODEL, system_instruction=QUALIFICATION_INSTRUCTIONS)
+        # Client propre à la clé: genai.configure est global au processus et le SDK n'offre pas de
+        # client par modèle. Contournement vérifié sur google-generativeai 0.7.0 à 0.8.5 (version
+        # épinglée dans requirements.txt): GenerativeModel ne crée son client (_client) que s'il est
+        # None, et le client est construit par la fabrique du SDK (user-agent, métadonnées par défaut)
+        manager = genai_client._ClientManager()
+        manager.configure(api_key=api_key)
+        model._client = manager.make_client("generative")
+        models.append(model)
+    return models
+
+
+def chunked(iterable, size: int):
+    """Découpe un itérable en listes de taille size (la dernière peut être plus courte)"""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def qualification_key(org: dict) -> str:
+    """Clé de cache d'une organisation: nom, type et URLs triées de ses articles (+ modèle et instructions)"""
+    payload = orjson.dumps([
+        GEMINI_MODEL,
+        QUALIFICATION_INSTRUCTIONS,
+        org['nom'],
+        org['type'],
+        sorted(article['url'] for article in org['articles'])  # Indépendant de l'ordre des articles
+    ])
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
+def format_organization(org_id: int, org: dict) -> str:
+    """Bloc de prompt décrivant une organisation et ses actions (max 5 premiers articles)"""
+    contexte = "\n\n".join(
+        _ARTICLE_TMPL.format(i=i, **article) for i, article in enumerate(islice(org['articles'], 5), 1)
+    )
+
+    return (
+        f"### ORG {org_id}\n"
+        f"NOM: {org['nom']}\n"
+        f"TYPE: {org['type']}\n"
+        f"MENTIONS: {org['mentions']}\n\n"
+        f"**CONTEXTE DES ACTIONS:**\n{contexte}"
+    )
+
+
+def validate_qualification(qualification) -> dict | None:
+    """Qualification utilisable (champs requis présents, score entier), sinon None"""
+    if not isinstance(qualification, dict) or any(field not in qualification for field in REQUIRED_FIELDS):
+        return None
+    try:
+        qualification['score'] = int(qualification['score'])
+    except (TypeError, ValueError):
+        return None
+    return qualification
 
 
-def qualify_organization(model, org: dict) -> dict:
-    """Qualifie une organisation avec Gemini"""
+def qualify_batch(model, orgs: list[dict]) -> list[dict | None]:
+    """Qualifie un lot d'organisations en un seul appel Gemini (None pour chaque échec)"""
     try:
-        # Construire le contexte des actions (max 5 premiers articles)
-        contexte_actions = []
-        for i, article in enumerate(org['articles'][:5], 1):
-            contexte_actions.append(
-                f"{i}. Action: {article['action']}\n"
-                f"   Enjeu: {article['enjeu']}\n"
-                f"   Signal: {article['signal']}\n"
-                f"   Résumé: {article['resume']}"
-            )
-        contexte = "\n\n".join(contexte_actions)
-
-        prompt = QUALIFICATION_PROMPT.format(
-            nom=org['nom'],
-            type=org['type'],
-            mentions=org['mentions'],
-            contexte_actions=contexte
-        )
-
-        response = model.generate_content(prompt)
-        response_text = response.text.strip()
+        blocks = "\n\n".join(format_organization(org_id, org) for org_id, org in enumerate(orgs, 1))
+        prompt = f"**ORGANISATIONS À ÉVALUER:**\n\n{blocks}"
 
         # Nettoyer le markdown si présent
-        if response_text.startswith("```json"):
-            response_text = response_text[7:]
-        if response_text.startswith("```"):
-            response_text = response_text[3:]
-        if response_text.endswith("```"):
-            response_text = response_text[:-3]
-        response_text = response_text.strip()
+        response_text = _FENCE_RE.sub("", model.generate_content(prompt).text)
 
         # Parser le JSON
         try:
-            qualification = json.loads(response_text)
-        except json.JSONDecodeError as json_err:
-            print(f"   ⚠️  JSON invalide pour {org['nom'][:30]}")
-            return None
-
-        return qualification
+            qualifications = orjson.loads(response_text)
+        except orjson.JSONDecodeError:
+            print(f"   ⚠️  JSON invalide pour le lot {orgs[0]['nom'][:30]}...")
+            return [None] * len(orgs)
+
+        if isinstance(qualifications, dict):
+            qualifications = [qualifications]  # Lot d'une seule organisation
+
+        # Associer chaque réponse à son organisation par id ("1" accepté comme 1)
+        results = [None] * len(orgs)
+        without_id = []  # (position dans la réponse, qualification) des réponses sans id valide
+        for position, q in enumerate(qualifications):
+            if not isinstance(q, dict):
+                continue
+            try:
+                org_id = int(q.pop('id'))
+            except (KeyError, TypeError, ValueError):
+                without_id.append((position, q))
+                continue
+            if 1 <= org_id <= len(orgs):
+                results[org_id - 1] = q
+
+        # Réponses sans id: associées par position, seulement si le modèle a répondu une fois par organisation
+        if len(qualifications) == len(orgs):
+            for position, q in without_id:
+                if results[position] is None:
+                    results[position] = q
+
+        results = [validate_qualification(q) for q in results]
+
+        missing = results.count(None)
+        if missing:
+            print(f"   ⚠️  {missing}/{len(orgs)} organisation(s) sans réponse dans le lot {orgs[0]['nom'][:30]}...")
+        return results
 
     except Exception as e:
-        print(f"   ❌ Erreur qualification {org['nom'][:30]}: {str(e)[:100]}")
-        return None
-
+        print(f"   ❌ Erreur qualification du lot {orgs[0]['nom'][:30]}...: {str(e)[:100]}")
+        return [None] * len(orgs)
 
-def process_organization(task_data):
-    """Traite la qualification d'une organisation (pour parallélisation)"""
-    i, total, org, model = task_data
-
-    print(f"[{i}/{total}] {org['nom'][:60]}...")
-
-    qualification = qualify_organization(model, org)
 
+def report_qualification(i: int, total: int, org: dict, qualification: dict | None, cached: bool = False) -> dict | None:
+    """Affiche le résultat d'une organisation, retourne le lead si elle est qualifiée"""
+    origin = " (cache)" if cached else ""
     if qualification and qualification.get('lead_potentiel', False):
-        print(f"[{i}/{total}] ✅ LEAD (score {qualification['score']}/5): {qualification['raison'][:80]}")
+        print(f"[{i}/{total}] ✅ LEAD (score {qualification['score']}/5){origin} {org['nom'][:40]}: {qualification['raison'][:80]}")
         return {
             "organisation": org,
             "qualification": qualification
         }
+    elif qualification:
+        print(f"[{i}/{total}] ⏭️  Pas un lead (score {qualification.get('score', 0)}/5){origin} {org['nom'][:40]}")
     else:
+        print(f"[{i}/{total}] ⚠️  Non qualifiée {org['nom'][:40]}")
+    return None
+
+
+def process_batch(task_data):
+    """Traite la qualification d'un lot d'organisations (pour parallélisation)"""
+    total, batch, model = task_data
+
+    qualifications = qualify_batch(model, [org for _, org in batch])
+
+    # (clé, qualification, lead) pour chaque organisation du lot
+    results = []
+    for (i, org), qualification in zip(batch, qualifications):
+        key = qualification_key(org)
         if qualification:
-            print(f"[{i}/{total}] ⏭️  Pas un lead (score {qualification.get('score', 0)}/5)")
-        return None
+            record_put("qualifications", key, qualification)
+        lead = report_qualification(i, total, org, qualification)
+        results.append((key, qualification, lead))
+
+    return results
+
+
+def load_checkpoint(checkpoint_file: Path) -> dict:
+    """Charge les qualifications déjà faites lors d'une exécution précédente, indexées par clé"""
+    done = {}
+    if checkpoint_file.exists():
+        with open(checkpoint_file, 'rb') as f:
+            for line in f:
+                try:
+                    key, qualification = orjson.loads(line)
+                except (orjson.JSONDecodeError, ValueError):
+                    continue  # Ligne tronquée par une interruption
+                done[key] = qualification
+    return done
 
 
 def main():
     """Qualifie les organisations comme leads potentiels"""
     date_str = datetime.now().strftime("%Y-%m-%d")
 
+    # --no-cache: requalifier toutes les organisations (le cache est tout de même mis à jour)
+    use_cache = "--no-cache" not in sys.argv[1:]
+
     input_file = Path("data/warehouse") / f"google_news_organizations_{date_str}.json"
 
     # Créer le dossier marts
     marts_dir = Path("data/marts") / date_str
     marts_dir.mkdir(parents=True, exist_ok=True)
     output_file = marts_dir / "google_news_leads.json"
+    checkpoint_file = output_file.with_suffix('.jsonl')
 
     if not input_file.exists():
         print(f"❌ Fichier introuvable: {input_file}")
@@ -189,30 +295,53 @@ def main():
     print(f"🎯 Qualification des leads - {date_str}\n")
 
     # Initialiser Gemini
-    model = initialize_gemini()
-    print("✅ API Gemini initialisée")
-    print(f"⚡ Traitement parallèle avec {MAX_WORKERS} workers\n")
+    models = initialize_gemini()
+    workers = MAX_WORKERS * len(models)
+    print(f"✅ API Gemini initialisée ({len(models)} clé(s) API)")
+    print(f"⚡ Traitement parallèle avec {workers} workers\n")
 
     # Lire les organisations
-    with open(input_file, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-        organisations = data['organisations']
-
-    print(f"📊 {len(organisations)} organisations à qualifier\n")
+    organisations = orjson.loads(input_file.read_bytes())['organisations']
 
-    # Préparer les tâches pour traitement parallèle
-    tasks = [(i+1, len(organisations), org, model) for i, org in enumerate(organisations)]
+    total = len(organisations)
+    print(f"📊 {total} organisations à qualifier (lots de {BATCH_SIZE})\n")
 
-    # Traiter en parallèle
+    # Reprendre l'exécution du jour (checkpoint), puis réutiliser les qualifications récentes:
+    # seules les autres sont envoyées à Gemini
+    done = load_checkpoint(checkpoint_file) if use_cache else {}
     qualified_leads = []
+    misses = []
+    for i, org in enumerate(organisations, 1):
+        key = qualification_key(org)
+        qualification = validate_qualification(
+            done.get(key) or (record_get("qualifications", key, QUALIFICATION_TTL) if use_cache else None)
+        )
+        if qualification is None:
+            misses.append((i, org))
+            continue
+        lead = report_qualification(i, total, org, qualification, cached=True)
+        if lead:
+            qualified_leads.append(lead)
 
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        future_to_org = {executor.submit(process_organization, task): task for task in tasks}
+    if len(misses) < total:
+        print(f"\n♻️  {total - len(misses)} qualifications en cache, {len(misses)} à demander à Gemini\n")
 
-        for future in as_completed(future_to_org):
-            result = future.result()
-            if result:
-                qualified_leads.append(result)
+    # Préparer les tâches pour traitement parallèle (lots de BATCH_SIZE organisations)
+    # Les lots sont répartis à tour de rôle entre les clés API
+    tasks = [(total, batch, models[n % len(models)]) for n, batch in enumerate(chunked(misses, BATCH_SIZE))]
+
+    # Traiter en parallèle
+    with ThreadPoolExecutor(max_workers=workers) as executor, \
+            open(checkpoint_file, 'ab' if use_cache else 'wb') as checkpoint:
+        future_to_batch = {executor.submit(process_batch, task): task for task in tasks}
+
+        for future in as_completed(future_to_batch):
+            for key, qualification, lead in future.result():
+                if qualification:
+                    checkpoint.write(orjson.dumps([key, qualification]) + b"\n")
+                if lead:
+                    qualified_leads.append(lead)
+            checkpoint.flush()
 
     print()
 
@@ -227,8 +356,7 @@ def main():
         "leads": qualified_leads
     }
 
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(output_data, f, ensure_ascii=False, indent=2)
+    output_file.write_bytes(orjson.dumps(output_data, option=orjson.OPT_INDENT_2))
 
     # Résumé
     print(f"{'='*60}")
@@ -242,16 +370,12 @@ def main():
     # Distribution des scores
     if qualified_leads:
         print(f"\n📈 Distribution des scores:")
-        score_dist = {}
-        for lead in qualified_leads:
-            score = lead['qualification']['score']
-            score_dist[score] = score_dist.get(score, 0) + 1
+        score_dist = Counter(lead['qualification']['score'] for lead in qualified_leads)
 
-        for score in sorted(score_dist.keys(), reverse=True):
-            count = score_dist[score]
+        for score, count in sorted(score_dist.items(), reverse=True):
             print(f"   Score {score}/5: {count} leads")
 
-        # Top 10 leads
+        # Top 10 leads (déjà triés par score pour le fichier de sortie)
         print(f"\n🏆 Top 10 leads prioritaires:")
         for i, lead in enumerate(qualified_leads[:10], 1):
             org = lead['organisation']
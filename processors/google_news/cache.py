@@ -0,0 +1,81 @@
+"""
+Cache disque des réponses LLM, adressé par contenu
+Clé: sha256(modèle + prompt) -> data/cache/llm/<clé>.json
+Le prompt complet fait partie de la clé: modifier un gabarit de prompt invalide le cache
+
+Entrées JSON génériques (ex: qualification par organisation): data/cache/<namespace>/<clé>.json
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+
+CACHE_ROOT = Path("data/cache")
+CACHE_DIR = CACHE_ROOT / "llm"
+
+# Couche mémoire au-dessus du disque (déduplication au sein d'une même exécution)
+_memory = {}
+_lock = threading.Lock()
+
+
+def cache_key(prompt: str, model_name: str) -> str:
+    """Clé de cache pour un couple (modèle, prompt)"""
+    return hashlib.sha256(f"{model_name}\0{prompt}".encode('utf-8')).hexdigest()
+
+
+def write_atomic(path: Path, content: str):
+    """Écrit un fichier via un fichier temporaire + os.replace (jamais de fichier tronqué)"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp_file.write_text(content, encoding='utf-8')
+    os.replace(tmp_file, path)
+
+
+def llm_cached(prompt: str, model_name: str, fn) -> str:
+    """Retourne la réponse en cache pour (modèle, prompt), sinon appelle fn() et la met en cache"""
+    key = cache_key(prompt, model_name)
+
+    with _lock:
+        if key in _memory:
+            return _memory[key]
+
+    cache_file = CACHE_DIR / f"{key}.json"
+    if cache_file.exists():
+        response_text = json.loads(cache_file.read_text(encoding='utf-8'))["response"]
+    else:
+        response_text = fn()
+        write_atomic(cache_file, json.dumps({"model": model_name, "response": response_text}, ensure_ascii=False))
+
+    with _lock:
+        _memory[key] = response_text
+    return response_text
+
+
+def llm_forget(prompt: str, model_name: str):
+    """Retire une réponse du cache (ex: JSON inutilisable, pour qu'elle soit redemandée)"""
+    key = cache_key(prompt, model_name)
+
+    with _lock:
+        _memory.pop(key, None)
+
+    (CACHE_DIR / f"{key}.json").unlink(missing_ok=True)
+
+
+def record_get(namespace: str, key: str, max_age: float | None = None):
+    """Lit une entrée de data/cache/<namespace>/ (None si absente ou plus vieille que max_age secondes)"""
+    cache_file = CACHE_ROOT / namespace / f"{key}.json"
+    try:
+        if max_age is not None and time.time() - cache_file.stat().st_mtime > max_age:
+            return None
+        return json.loads(cache_file.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return None
+
+
+def record_put(namespace: str, key: str, value):
+    """Écrit une entrée JSON dans data/cache/<namespace>/"""
+    write_atomic(CACHE_ROOT / namespace / f"{key}.json", json.dumps(value, ensure_ascii=False))
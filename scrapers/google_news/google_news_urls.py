@@ -0,0 +1,62 @@
+"""
+Liens Google News et normalisation d'URLs d'articles, partagés par le scraper et les processors
+(scrapers/google_news/scraper.py et processors/google_news/2_download_html.py)
+"""
+
+import base64
+from urllib.parse import urlsplit, urlunsplit, urlencode, parse_qsl
+
+
+# Tag protobuf du champ qui contient l'URL de l'article (champ 4, type longueur-préfixée)
+GOOGLE_NEWS_URL_TAG = 0x22
+
+# Paramètres de suivi ignorés pour comparer les URLs (en plus des utm_*)
+TRACKING_PARAMS = {'gclid', 'fbclid', 'mc_cid', 'mc_eid', 'ocid', 'cmp', 'ref'}
+
+
+def resolve_google_news(url: str) -> str | None:
+    """
+    Décode l'URL de l'article depuis un lien Google News, sans navigateur
+    Retourne None si le lien est opaque (nouveau format) et exige la redirection JavaScript
+    """
+    parsed = urlsplit(url)
+    if parsed.netloc != 'news.google.com' or '/articles/' not in parsed.path:
+        return url
+
+    article_id = parsed.path.rsplit('/articles/', 1)[1]
+    try:
+        payload = base64.urlsafe_b64decode(article_id + '=' * (-len(article_id) % 4))
+    except ValueError:
+        return None
+
+    # Après le tag: longueur en varint (groupes de 7 bits, bit 0x80 = octet suivant), puis l'URL
+    # L'octet 0x22 peut aussi apparaître dans un champ précédent: on essaie chaque occurrence
+    start = payload.find(bytes([GOOGLE_NEWS_URL_TAG]))
+    while start != -1:
+        url = _read_length_prefixed_url(payload, start + 1)
+        if url:
+            return url
+        start = payload.find(bytes([GOOGLE_NEWS_URL_TAG]), start + 1)
+    return None
+
+
+def _read_length_prefixed_url(payload: bytes, pos: int) -> str | None:
+    """Lit une longueur varint à partir de pos puis exactement ce nombre d'octets; None si ce n'est pas une URL"""
+    length, shift = 0, 0
+    while pos < len(payload):
+        byte = payload[pos]
+        length |= (byte & 0x7f) << shift
+        pos += 1
+        if not byte & 0x80:
+            break
+        shift += 7
+    else:
+        return None
+
+    raw = payload[pos:pos + length]
+    if len(raw) != length or not raw.startswith((b'http://', b'https://')):
+        return None
+    try:
+        return raw.decode('ascii')
+    except UnicodeDecodeError:
+        return None
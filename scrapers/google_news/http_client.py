@@ -0,0 +1,16 @@
+"""
+Client HTTP partagé par les scrapers Google News
+Une seule Session: connexions keep-alive réutilisées, relances automatiques, User-Agent commun
+"""
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+SESSION = requests.Session()
+SESSION.headers.update({"User-Agent": "Mozilla/5.0 (compatible; OpubliqLeadBot/1.0)"})
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=10, pool_maxsize=10,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+))
@@ -4,13 +4,17 @@ Google News RSS Scraper for Lead Generation
 Collecte les articles des 7 derniers jours selon 2 signaux optimisés
 """
 
-import requests
-from datetime import datetime, timedelta
+import functools
+import os
+import shutil
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 import urllib.parse
-import xml.etree.ElementTree as ET
-from dateutil import parser as date_parser
-import pytz
+from lxml import etree
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor
+from http_client import SESSION
+from google_news_urls import resolve_google_news, canonical_url
 
 
 # Configuration des queries multiples - simplifiées et ciblées
@@ -72,6 +76,16 @@ SEARCH_QUERIES = {
     }
 }
 
+# Nombre de flux RSS téléchargés en parallèle
+MAX_WORKERS = 8
+
+# Espace de noms des balises <media:...> des items Google News
+MEDIA_NS = "http://search.yahoo.com/mrss/"
+
+# XPaths compilées une seule fois
+_LINK_XPATH = etree.XPath("string(link)", smart_strings=False)
+_PUBDATE_XPATH = etree.XPath("string(pubDate)", smart_strings=False)
+
 # Configuration Google News RSS
 BASE_URL = "https://news.google.com/rss/search"
 PARAMS = {
@@ -79,38 +93,53 @@ PARAMS = {
     "gl": "CA",
     "ceid": "CA:fr"
 }
+# Partie fixe de la query string, encodée une seule fois (seul q change d'une URL à l'autre)
+_FIXED_QUERY = urllib.parse.urlencode(PARAMS)
 
 
 def construct_rss_url(query: str) -> str:
     """Construit l'URL complète pour Google News RSS"""
-    params = PARAMS.copy()
-    params["q"] = query
-    return f"{BASE_URL}?{urllib.parse.urlencode(params)}"
+    return f"{BASE_URL}?{_FIXED_QUERY}&q={urllib.parse.quote_plus(query)}"
 
 
-def fetch_rss_feed(url: str) -> str:
-    """Récupère le contenu XML d'un flux RSS"""
-    headers = {
-        "User-Agent": "Mozilla/5.0 (compatible; OpubliqLeadBot/1.0)"
-    }
-
-    response = requests.get(url, headers=headers, timeout=30)
-    response.raise_for_status()
-    return response.text
+# URLs des flux, construites une seule fois (SEARCH_QUERIES est fixe)
+QUERY_URLS = {signal_name: construct_rss_url(config["query"]) for signal_name, config in SEARCH_QUERIES.items()}
 
 
-def filter_rss_by_date(xml_content: str, days: int = 14) -> tuple[str, dict]:
+def fetch_rss_feed(url: str, output_file: Path) -> Path:
+    """
+    Télécharge le flux RSS brut directement sur disque, par blocs de 64 Ko
+    Le corps de la réponse n'est jamais entièrement chargé en mémoire
+    """
+    tmp_file = output_file.with_name(f"{output_file.name}.tmp")
+    with SESSION.get(url, timeout=30, stream=True) as response:
+        response.raise_for_status()
+        response.raw.decode_content = True  # Décompression gzip/br à la volée
+        with open(tmp_file, 'wb') as f:
+            shutil.copyfileobj(response.raw, f, length=65536)
+    os.replace(tmp_file, output_file)
+    return output_file
+
+
+@functools.lru_cache(maxsize=1024)
+def _parse_pubdate(pub_date_text: str) -> datetime | None:
+    """Parse un pubDate RSS (mis en cache: plusieurs items partagent souvent la même date)"""
+    try:
+        # pubDate RSS au format RFC 822 (ex: "Mon, 12 Aug 2025 14:03:00 GMT")
+        pub_date = parsedate_to_datetime(pub_date_text)
+    except (TypeError, ValueError):
+        return None
+    if pub_date.tzinfo is None:
+        pub_date = pub_date.replace(tzinfo=timezone.utc)  # Fuseau "-0000": UTC
+    return pub_date
+
+
+def filter_rss_by_date(xml_file: Path, days: int = 14) -> tuple[list, dict]:
     """
     Filtre le XML RSS pour garder seulement les articles des X derniers jours
-    Retourne le XML filtré et des stats
+    Retourne les éléments <item> gardés et des stats
     """
-    root = ET.fromstring(xml_content)
-    channel = root.find('channel')
-
-    if channel is None:
-        return xml_content, {"error": "No channel found"}
-
-    now = datetime.now(pytz.UTC)
+    now = datetime.now(timezone.utc)
     cutoff_date = now - timedelta(days=days)
 
     stats = {
@@ -121,72 +150,112 @@ def filter_rss_by_date(xml_content: str, days: int = 14) -> tuple[str, dict]:
         "newest_kept": None
     }
 
-    items_to_remove = []
+    channel = None
+    kept_items = []
     kept_dates = []
 
-    for item in channel.findall('item'):
-        stats["total"] += 1
-        pub_date_elem = item.find('pubDate')
+    # Parcours en streaming: chaque <item> écarté est vidé dès qu'il est lu
+    events = etree.iterparse(str(xml_file), events=('start', 'end'),
+                             huge_tree=True, recover=True)
+    for event, elem in events:
+        if event == 'start':
+            if channel is None and elem.tag == 'channel':
+                channel = elem
+            continue
 
-        if pub_date_elem is None or not pub_date_elem.text:
-            items_to_remove.append(item)
-            stats["removed"] += 1
+        if elem.tag != 'item':
             continue
 
-        try:
-            pub_date = date_parser.parse(pub_date_elem.text)
+        stats["total"] += 1
+        pub_date_text = _PUBDATE_XPATH(elem)
+        pub_date = _parse_pubdate(pub_date_text) if pub_date_text else None
 
-            if pub_date < cutoff_date or pub_date > now:
-                items_to_remove.append(item)
-                stats["removed"] += 1
-            else:
-                stats["kept"] += 1
-                kept_dates.append(pub_date)
-        except:
-            items_to_remove.append(item)
+        if pub_date is None or pub_date < cutoff_date or pub_date > now:
             stats["removed"] += 1
+            elem.clear()
+        else:
+            stats["kept"] += 1
+            kept_items.append(elem)
+            kept_dates.append(pub_date)
 
-    # Supprimer les items filtrés
-    for item in items_to_remove:
-        channel.remove(item)
+    if channel is None:
+        return [], {"error": "No channel found"}
 
     if kept_dates:
         stats["oldest_kept"] = min(kept_dates)
         stats["newest_kept"] = max(kept_dates)
 
-    # Retourner le XML filtré
-    filtered_xml = ET.tostring(root, encoding='utf-8', xml_declaration=True).decode('utf-8')
-    return filtered_xml, stats
+    return kept_items, stats
+
+
+def build_rss(items: list, title: str, description: str):
+    """Construit un document RSS valide (<rss><channel>) contenant les items"""
+    rss_root = etree.Element('rss', version='2.0', nsmap={'media': MEDIA_NS})
+    channel = etree.SubElement(rss_root, 'channel')
+
+    etree.SubElement(channel, 'title').text = title
+    etree.SubElement(channel, 'description').text = description
+    etree.SubElement(channel, 'language').text = 'fr-CA'
+
+    channel.extend(items)
+    return rss_root
 
 
-def save_rss_content(content: str, signal_name: str, date_str: str) -> Path:
-    """Filtre et sauvegarde le contenu RSS dans le data lake"""
+def write_atomic(path: Path, data: bytes):
+    """Écrit un fichier via un fichier temporaire + os.replace (jamais de XML tronqué)"""
+    tmp_file = path.with_name(f"{path.name}.tmp")
+    with open(tmp_file, 'wb', buffering=0) as f:  # Contenu déjà en mémoire: un seul write()
+        f.write(data)
+    os.replace(tmp_file, path)
+
+
+def save_rss_content(signal_name: str, output_dir: Path, date_str: str) -> tuple[list, dict]:
+    """
+    Filtre le flux brut <signal>.xml téléchargé par fetch_rss_feed et le réécrit filtré, au même endroit
+    output_dir est créé une seule fois par main()
+    Retourne les éléments <item> gardés et les stats du filtrage
+    """
+    xml_file = output_dir / f"{signal_name}.xml"
+
     # Filtrer pour garder seulement les 14 derniers jours
-    filtered_content, stats = filter_rss_by_date(content, days=14)
+    items, stats = filter_rss_by_date(xml_file, days=14)
+    rss_root = build_rss(items, f'Google News - {signal_name} - {date_str}',
+                         'Articles des 14 derniers jours')
 
-    output_dir = Path("data/lake/google_news_rss") / date_str
-    output_dir.mkdir(parents=True, exist_ok=True)
+    write_atomic(xml_file, etree.tostring(rss_root, encoding='utf-8', xml_declaration=True))
+
+    return items, stats
 
-    output_file = output_dir / f"{signal_name}.xml"
-    output_file.write_text(filtered_content, encoding="utf-8")
 
-    return output_file, stats
+@functools.lru_cache(maxsize=100_000)
+def canonicalize_url(url: str) -> str:
+    """
+    URL canonique d'un article, pour la déduplication
+    Lien Google News décodé quand possible, domaine en minuscules, sans fragment ni paramètres de suivi
+    """
+    resolved_url = resolve_google_news(url)
+    if resolved_url is None:
+        # Lien opaque (nouveau format): l'identifiant de l'article suffit comme clé de déduplication
+        return f"https://news.google.com{urllib.parse.urlsplit(url).path}"
+
+    return canonical_url(resolved_url)
 
 
 def deduplicate_articles(all_items: list) -> tuple[list, dict]:
     """
-    Déduplique les articles par URL
+    Déduplique les articles par URL canonique
     Retourne les articles uniques et des stats
     """
-    seen_urls = {}
+    # Empreintes 64 bits des URLs (les liens Google News font ~300 caractères)
+    seen_hashes: set[int] = set()
     unique_items = []
 
     for item in all_items:
-        link_elem = item.find('link')
-        if link_elem is not None and link_elem.text:
-            url = link_elem.text
-            if url not in seen_urls:
-                seen_urls[url] = True
+        url = _LINK_XPATH(item)
+        if url:
+            url_hash = hash(canonicalize_url(url))
+            if url_hash not in seen_hashes:
+                seen_hashes.add(url_hash)
                 unique_items.append(item)
 
     stats = {
@@ -205,33 +274,37 @@ def main():
     print(f"🔍 Collecte des flux Google News RSS - {date_str}")
     print(f"📁 Destination: data/lake/google_news_rss/{date_str}/\n")
 
+    output_dir = Path("data/lake/google_news_rss") / date_str
+    output_dir.mkdir(parents=True, exist_ok=True)
+
     all_items = []
     query_results = []
 
+    # Télécharger tous les flux bruts en parallèle, un fichier <signal>.xml chacun
+    # (le traitement reste séquentiel, dans l'ordre des queries)
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        feeds = {
+            signal_name: executor.submit(fetch_rss_feed, url, output_dir / f"{signal_name}.xml")
+            for signal_name, url in QUERY_URLS.items()
+        }
+
     for signal_name, config in SEARCH_QUERIES.items():
         print(f"📰 Query: {signal_name}")
         print(f"   Description: {config['description']}")
         print(f"   Query: {config['query']}")
 
         try:
-            # Construire l'URL et récupérer le flux
-            url = construct_rss_url(config["query"])
+            # Récupérer le flux téléchargé (relance l'erreur éventuelle du téléchargement)
+            feeds[signal_name].result()
 
-            content = fetch_rss_feed(url)
-
-            # Filtrer par date
-            filtered_content, filter_stats = filter_rss_by_date(content, days=14)
-
-            # Parser le XML filtré et extraire les items
-            root = ET.fromstring(filtered_content)
-            channel = root.find('channel')
-            if channel is not None:
-                items = channel.findall('item')
+            # Filtrer par date et remplacer le flux brut par sa version filtrée (items gardés, sans re-parser)
+            items, filter_stats = save_rss_content(signal_name, output_dir, date_str)
+            if "error" not in filter_stats:
                 all_items.extend(items)
 
                 print(f"   📊 Articles: {filter_stats['total']} → {filter_stats['kept']} gardés")
                 if filter_stats.get('oldest_kept'):
-                    days_old = (datetime.now(pytz.UTC) - filter_stats['oldest_kept']).days
+                    days_old = (datetime.now(timezone.utc) - filter_stats['oldest_kept']).days
                     print(f"   📅 Plus ancien: {days_old} jours")
 
                 query_results.append({
@@ -266,26 +339,13 @@ def main():
 
     # Créer un XML consolidé avec les articles uniques
     if unique_items:
-        # Créer une structure RSS valide
-        rss_root = ET.Element('rss', version='2.0')
-        rss_root.set('xmlns:media', 'http://search.yahoo.com/mrss/')
-        channel = ET.SubElement(rss_root, 'channel')
-
-        ET.SubElement(channel, 'title').text = f'Google News - Lead Generation - {date_str}'
-        ET.SubElement(channel, 'description').text = 'Articles consolidés et dédupliqués'
-        ET.SubElement(channel, 'language').text = 'fr-CA'
-
-        # Ajouter tous les items uniques
-        for item in unique_items:
-            channel.append(item)
+        # Créer une structure RSS valide avec tous les items uniques
+        rss_root = build_rss(unique_items, f'Google News - Lead Generation - {date_str}',
+                             'Articles consolidés et dédupliqués')
 
         # Sauvegarder
-        output_dir = Path("data/lake/google_news_rss") / date_str
-        output_dir.mkdir(parents=True, exist_ok=True)
-
         output_file = output_dir / "articles_consolidated.xml"
-        xml_string = ET.tostring(rss_root, encoding='utf-8', xml_declaration=True).decode('utf-8')
-        output_file.write_text(xml_string, encoding='utf-8')
+        write_atomic(output_file, etree.tostring(rss_root, encoding='utf-8', xml_declaration=True))
 
         file_size = output_file.stat().st_size
         print(f"✅ Fichier consolidé créé: {output_file}")
@@ -4,23 +4,47 @@ Script de test pour vérifier le filtrage par date de Google News RSS
 Teste différentes configurations d'URL pour obtenir seulement les 7 derniers jours
 """
 
-import requests
+import heapq
 import urllib.parse
-import xml.etree.ElementTree as ET
-from datetime import datetime, timedelta
-from dateutil import parser as date_parser
-import pytz
+from lxml import etree
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from http_client import SESSION
+
+
+# Balises lues dans chaque <item>
+ITEM_FIELDS = ('title', 'pubDate', 'link')
+
+
+@dataclass(slots=True)
+class Article:
+    """Article d'un flux RSS de test"""
+    title: str
+    pub_date: datetime
+    pub_date_str: str
+    link: str
+    is_recent: bool
+
+    @property
+    def days_ago(self) -> int:
+        """Âge en jours, calculé seulement pour les articles affichés"""
+        return (datetime.now(timezone.utc) - self.pub_date).days
+
+
+@lru_cache(maxsize=1024)
+def _parse_pubdate(pub_date_str: str) -> datetime:
+    """Parse un pubDate RSS (RFC 822), mis en cache car les dates se répètent d'un item à l'autre"""
+    return parsedate_to_datetime(pub_date_str)
 
 
 def test_rss_url(query: str, description: str, extra_params: dict = None) -> dict:
     """
     Teste une URL Google News RSS et analyse les dates des articles
+    N'affiche rien (exécuté dans un thread): le rapport est imprimé par print_test_report
     """
-    print(f"\n{'=' * 80}")
-    print(f"Test: {description}")
-    print(f"Query: {query}")
-    print(f"{'=' * 80}")
-
     # Construire l'URL
     base_url = "https://news.google.com/rss/search"
     params = {
@@ -35,98 +59,112 @@ def test_rss_url(query: str, description: str, extra_params: dict = None) -> dic
         params.update(extra_params)
 
     url = f"{base_url}?{urllib.parse.urlencode(params)}"
-    print(f"URL: {url}\n")
+    date_errors = []
 
     try:
-        # Récupérer le flux RSS
-        headers = {"User-Agent": "Mozilla/5.0 (compatible; OpubliqLeadBot/1.0)"}
-        response = requests.get(url, headers=headers, timeout=30)
-        response.raise_for_status()
-
-        # Parser le XML
-        root = ET.fromstring(response.content)
-
-        # Extraire les articles
-        articles = []
-        now = datetime.now(pytz.UTC)
-        seven_days_ago = now - timedelta(days=7)
-
-        for item in root.findall('.//item'):
-            title_elem = item.find('title')
-            pub_date_elem = item.find('pubDate')
-            link_elem = item.find('link')
-
-            if title_elem is not None and pub_date_elem is not None:
-                title = title_elem.text
-                pub_date_str = pub_date_elem.text
-                link = link_elem.text if link_elem is not None else "N/A"
-
-                # Parser la date
-                try:
-                    pub_date = date_parser.parse(pub_date_str)
-                    days_ago = (now - pub_date).days
-
-                    articles.append({
-                        'title': title,
-                        'pub_date': pub_date,
-                        'pub_date_str': pub_date_str,
-                        'days_ago': days_ago,
-                        'link': link,
-                        'within_7_days': pub_date >= seven_days_ago
-                    })
-                except Exception as e:
-                    print(f"Erreur parsing date: {pub_date_str} - {e}")
-
-        # Trier par date (plus récent d'abord)
-        articles.sort(key=lambda x: x['pub_date'], reverse=True)
-
-        # Afficher les résultats
-        print(f"Nombre d'articles trouvés: {len(articles)}\n")
-
-        within_7_days = [a for a in articles if a['within_7_days']]
-        outside_7_days = [a for a in articles if not a['within_7_days']]
-
-        print(f"✅ Dans les 7 derniers jours: {len(within_7_days)}")
-        print(f"❌ Plus de 7 jours: {len(outside_7_days)}\n")
-
-        if outside_7_days:
-            print("⚠️  ARTICLES TROP VIEUX DÉTECTÉS:")
-            for article in outside_7_days[:5]:  # Montrer les 5 plus vieux
-                print(f"  - {article['days_ago']} jours: {article['title'][:80]}")
-                print(f"    Date: {article['pub_date_str']}")
-                print(f"    Link: {article['link'][:100]}")
-                print()
-
-        if within_7_days:
-            print("✅ Exemples d'articles récents:")
-            for article in within_7_days[:3]:
-                print(f"  - {article['days_ago']} jours: {article['title'][:80]}")
-                print(f"    Date: {article['pub_date_str']}")
-                print()
+        # Récupérer le flux RSS en flux: lxml lit directement le corps de la réponse
+        with SESSION.get(url, timeout=30, stream=True) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True  # Décompression gzip/br à la volée
+
+            # Extraire les articles, répartis selon leur date au fil de la lecture
+            within_7_days, outside_7_days = [], []
+            threshold = datetime.now(timezone.utc) - timedelta(days=7)
+
+            # Parser le XML en flux: chaque <item> est libéré dès qu'il est lu
+            for _, item in etree.iterparse(response.raw, events=('end',), tag='item', recover=True):
+                # Un seul passage sur les enfants de l'item
+                fields = dict.fromkeys(ITEM_FIELDS)
+                for child in item:
+                    if child.tag in fields:
+                        fields[child.tag] = child.text
+                title = fields['title']
+                pub_date_str = fields['pubDate']
+                link = fields['link'] or "N/A"
+
+                if title and pub_date_str:
+                    # Parser la date
+                    try:
+                        pub_date = _parse_pubdate(pub_date_str)
+                        is_recent = pub_date >= threshold
+                        bucket = within_7_days if is_recent else outside_7_days
+                        bucket.append(Article(title, pub_date, pub_date_str, link, is_recent))
+                    except Exception as e:
+                        date_errors.append(f"Erreur parsing date: {pub_date_str} - {e}")
+
+                item.clear(keep_tail=True)
+                while item.getprevious() is not None:
+                    del item.getparent()[0]
+
+        # Seuls quelques exemples sont affichés: sélection top-k au lieu d'un tri complet
+        articles = within_7_days + outside_7_days
 
         return {
             'success': True,
+            'url': url,
+            'date_errors': date_errors,
             'total_articles': len(articles),
             'within_7_days': len(within_7_days),
             'outside_7_days': len(outside_7_days),
+            'recent_examples': heapq.nlargest(3, within_7_days, key=lambda a: a.pub_date),
+            'old_examples': heapq.nsmallest(5, outside_7_days, key=lambda a: a.pub_date),
             'articles': articles
         }
 
     except Exception as e:
-        print(f"❌ Erreur: {e}")
         return {
             'success': False,
+            'url': url,
             'error': str(e)
         }
 
 
+def print_test_report(query: str, description: str, result: dict):
+    """Affiche le rapport d'un test (appelé séquentiellement, une fois les requêtes terminées)"""
+    print(f"\n{'=' * 80}")
+    print(f"Test: {description}")
+    print(f"Query: {query}")
+    print(f"{'=' * 80}")
+    print(f"URL: {result['url']}\n")
+
+    if not result['success']:
+        print(f"❌ Erreur: {result['error']}")
+        return
+
+    for error in result['date_errors']:
+        print(error)
+
+    print(f"Nombre d'articles trouvés: {result['total_articles']}\n")
+
+    print(f"✅ Dans les 7 derniers jours: {result['within_7_days']}")
+    print(f"❌ Plus de 7 jours: {result['outside_7_days']}\n")
+
+    if result['old_examples']:
+        print("⚠️  ARTICLES TROP VIEUX DÉTECTÉS:")
+        for article in result['old_examples']:  # Montrer les 5 plus vieux
+            print(f"  - {article.days_ago} jours: {article.title[:80]}")
+            print(f"    Date: {article.pub_date_str}")
+            print(f"    Link: {article.link[:100]}")
+            print()
+
+    if result['recent_examples']:
+        print("✅ Exemples d'articles récents:")
+        for article in result['recent_examples']:
+            print(f"  - {article.days_ago} jours: {article.title[:80]}")
+            print(f"    Date: {article.pub_date_str}")
+            print()
+
+
 def main():
     """
     Teste différentes configurations de query pour trouver celle qui filtre correctement
     """
+    now = datetime.now()
+    seven_days_ago = now - timedelta(days=7)
+
     print("🧪 Test du filtrage par date de Google News RSS")
-    print(f"📅 Date actuelle: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print(f"📅 7 jours avant: {(datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"📅 Date actuelle: {now.strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"📅 7 jours avant: {seven_days_ago.strftime('%Y-%m-%d %H:%M:%S')}")
 
     # Différentes variations à tester
     test_queries = [
@@ -141,16 +179,23 @@ def main():
         },
         {
             "query": "(association OR fédération) (dénonce OR réagit) Québec after:{}".format(
-                (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
+                seven_days_ago.strftime('%Y-%m-%d')
             ),
             "description": "Utiliser after:YYYY-MM-DD"
         }
     ]
 
+    # Les 3 requêtes sont indépendantes: lancées en parallèle sur la session partagée
+    with ThreadPoolExecutor(max_workers=len(test_queries)) as executor:
+        test_results = list(executor.map(
+            lambda c: test_rss_url(c["query"], c["description"], c.get("params")),
+            test_queries
+        ))
+
+    # Rapports affichés dans l'ordre des tests, une fois tous les résultats reçus
     results = []
-    for test_config in test_queries:
-        extra_params = test_config.get("params", None)
-        result = test_rss_url(test_config["query"], test_config["description"], extra_params)
+    for test_config, result in zip(test_queries, test_results):
+        print_test_report(test_config["query"], test_config["description"], result)
         results.append({
             'config': test_config,
             'result': result